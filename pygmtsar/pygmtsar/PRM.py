@@ -7,6 +7,7 @@
 # 
 # Licensed under the BSD 3-Clause License (see LICENSE for details)
 # ----------------------------------------------------------------------------
+import functools
 from .datagrid import datagrid
 from .PRM_gmtsar import PRM_gmtsar
 
@@ -59,68 +60,159 @@ class PRM(datagrid, PRM_gmtsar):
 
         - Huber, P. J. (1973). Robust regression: asymptotics, conjectures and Monte Carlo. The Annals of Statistics, 1(5), 799-821.
         """
+        return PRM.robust_trend2d_batch(data[:,0], data[:,1], [data[:,2]], rank)[0]
+
+    @staticmethod
+    def robust_trend2d_batch(x, y, zs, rank):
+        """
+        Perform robust linear regression to estimate the trends for multiple data columns on the same 2D coordinates.
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            1D array of length N containing the x-coordinates of the data points.
+        y : numpy.ndarray
+            1D array of length N containing the y-coordinates of the data points.
+        zs : list of numpy.ndarray
+            List of K 1D arrays of length N containing the z-values to fit independently.
+        rank : int or list of int
+            Number of model parameters to fit, the same for all the columns or defined per column.
+            Should be 1, 2, or 3, see robust_trend2d() for details.
+
+        Returns
+        -------
+        list
+            List of K lists containing the estimated trend coefficients for every column.
+
+        Raises
+        ------
+        Exception
+            If the specified rank is not 1, 2, or 3.
+
+        Notes
+        -----
+        The coordinates normalization and the design matrix are shared between the columns
+        while the iteratively reweighted least squares fitting is independent for every column.
+        """
         import numpy as np
-        from sklearn.linear_model import LinearRegression
+        from scipy.special import betaincinv
         # scale factor for normally distributed data is 1.4826
         # https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.median_abs_deviation.html
         MAD_NORMALIZE = 1.4826
         # significance value
         sig_threshold = 0.51
+        # weights change threshold, it is the standard IRLS convergence criterion
+        weights_threshold = 1e-4
 
-        if rank not in [1,2,3]:
+        ranks = [rank] * len(zs) if np.isscalar(rank) else list(rank)
+        if len(ranks) != len(zs):
+            raise Exception('Number of model parameters "rank" should be defined for every data column')
+        if not all([rank in [1,2,3] for rank in ranks]):
             raise Exception('Number of model parameters "rank" should be 1, 2, or 3')
 
-        #see gmt_stat.c
-        def gmtstat_f_q (chisq1, nu1, chisq2, nu2):
-            import scipy.special as sc
-
-            if chisq1 == 0.0:
-                return 1
-            if chisq2 == 0.0:
-                return 0
-            return sc.betainc(0.5*nu2, 0.5*nu1, chisq2/(chisq2+chisq1))
-
-        if rank in [2,3]:
-            x = data[:,0]
-            x = np.interp(x, (x.min(), x.max()), (-1, +1))
-        if rank == 3:
-            y = data[:,1]
-            y = np.interp(y, (y.min(), y.max()), (-1, +1))
-        z = data[:,2]
-        w = np.ones(z.shape)
-
-        if rank == 1:
-            xy = np.expand_dims(np.zeros(z.shape),1)
-        elif rank == 2:
-            xy = np.expand_dims(x,1)
-        elif rank == 3:
-            xy = np.stack([x,y]).transpose()
-
-        # create linear regression object
-        mlr = LinearRegression()
-
-        chisqs = []
-        coeffs = []
-        while True:
-            # fit linear regression
-            mlr.fit(xy, z, sample_weight=w)
-
-            r = np.abs(z - mlr.predict(xy))
-            chisq = np.sum((r**2*w))/(z.size-3)    
-            chisqs.append(chisq)
-            k = 1.5 * MAD_NORMALIZE * np.median(r)
-            w = np.where(r <= k, 1, (2*k/r) - (k * k/(r**2)))
-            sig = 1 if len(chisqs)==1 else gmtstat_f_q(chisqs[-1], z.size-3, chisqs[-2], z.size-3)
-            # Go back to previous model only if previous chisq < current chisq
-            if len(chisqs)==1 or chisqs[-2] > chisqs[-1]:
-                coeffs = [mlr.intercept_, *mlr.coef_]
-
-            #print ('chisq', chisq, 'significant', sig)
-            if sig < sig_threshold:
-                break
+        # exact median by quickselect, it skips np.median generic axis and NaN handling
+        def fast_median(r):
+            n = r.size
+            m = n//2
+            if n % 2:
+                return np.partition(r, m)[m]
+            p = np.partition(r, (m-1, m))
+            return 0.5*(p[m-1] + p[m])
+
+        # affine transform to [-1, +1] range, the same as np.interp(v, (v.min(), v.max()), (-1, +1))
+        def normalize(v):
+            lo, hi = v.min(), v.max()
+            if hi == lo:
+                # np.interp returns the right boundary value for the degenerated range
+                return np.ones(v.size)
+            return (2.0/(hi - lo))*(v - lo) - 1.0
+
+        # design matrix with intercept column, it is the same for all the columns and iterations
+        # the first "rank" columns are used for every fit
+        size = x.size
+        columns = [np.ones(size)]
+        if max(ranks) >= 2:
+            columns.append(normalize(x))
+        if max(ranks) == 3:
+            columns.append(normalize(y))
+        X_full = np.column_stack(columns)
+        # the constant coordinate column duplicates the intercept, exclude it from the fit and use zero coefficient
+        # the same as centered linear regression does (see sklearn.linear_model.LinearRegression)
+        degenerate = [False] + [bool(np.ptp(v) == 0) for v in [x, y][:len(columns)-1]]
+
+        # loop invariants: degrees of freedom for 3 model parameters and Huber threshold scale
+        nu = size - 3
+        inv_nu = 1.0/nu
+        MAD_K = 1.5 * MAD_NORMALIZE
+        # F-test significance for equal degrees of freedom (see gmt_stat.c gmtstat_f_q) is betainc(nu/2, nu/2, ratio)
+        # for ratio = previous chisq/(previous chisq + current chisq), it is monotonic and the check
+        # "significance < sig_threshold" is equal to "ratio < ratio_threshold"
+        ratio_threshold = betaincinv(0.5*nu, 0.5*nu, sig_threshold)
+
+        # the residuals and weights buffers are reused for all the columns and iterations
+        r = np.empty(size)
+        q = np.empty(size)
+        def irls_step(X, z, w):
+            # fit weighted linear regression
+            sw = np.sqrt(w)
+            beta = np.linalg.lstsq(X * sw[:,None], z * sw, rcond=None)[0]
+            # absolute residuals
+            np.matmul(X, beta, out=r)
+            np.subtract(z, r, out=r)
+            np.abs(r, out=r)
+            # weighted chi-square as dot product without r**2*w temporaries
+            np.multiply(r, r, out=q)
+            chisq = np.dot(q, w)*inv_nu
+            k = MAD_K * fast_median(r)
+            # w = 1 for r <= k and w = 2k/r - k²/r² otherwise, that is w = q*(2-q) for q = min(k/r, 1)
+            # fmin replaces NaN for k = r = 0 case by 1
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.divide(k, r, out=q)
+            np.fmin(q, 1, out=q)
+            np.subtract(2, q, out=w)
+            np.multiply(w, q, out=w)
+            return beta, chisq, w
+
+        def irls(X, z):
+            w = np.ones(size)
+            # the weights are updated in-place
+            w_prev = np.empty(size)
+            # only the two last chisq values are used
+            prev_chisq = np.inf
+            last_chisq = np.inf
+            first_iter = True
+            coeffs = []
+            while True:
+                np.copyto(w_prev, w)
+                beta, chisq, w = irls_step(X, z, w)
+                prev_chisq, last_chisq = last_chisq, chisq
+                # Go back to previous model only if previous chisq < current chisq
+                if first_iter or prev_chisq > last_chisq:
+                    coeffs = beta.tolist()
+                if first_iter:
+                    first_iter = False
+                    continue
+
+                #print ('chisq', chisq)
+                # significance is 1 for zero current chisq
+                if last_chisq > 0 and prev_chisq/(prev_chisq+last_chisq) < ratio_threshold:
+                    break
+                # stop when the weights are stable
+                if np.max(np.abs(w - w_prev)) < weights_threshold:
+                    break
+            return coeffs
+
+        def fit(z, rank):
+            if not any(degenerate[:rank]):
+                return irls(X_full[:,:rank], z)
+            coeffs = [0.0] * rank
+            active = [col for col in range(rank) if not degenerate[col]]
+            for col, coeff in zip(active, irls(X_full[:,active], z)):
+                coeffs[col] = coeff
+            return coeffs
 
         # get the slope and intercept of the line best fit
-        return (coeffs[:rank])
+        return [fit(np.ascontiguousarray(z), rank) for z, rank in zip(zs, ranks)]
 
 #     # standalone function is compatible but it is too slow while it should not be a problem
 #     @staticmethod
@@ -224,11 +316,38 @@ class PRM(datagrid, PRM_gmtsar):
         PRM
             A PRM object.
         """
+        import os
         #data = json.loads(document)
-        prm = PRM._from_io(prm_filename)
+        # the same PRM files are read many times during the processing (like to SBAS.PRM(subswath, date) calls
+        # for every interferogram), reuse parsed content for unchanged files
+        # return a copy because PRM objects are modified in place by set() calls
+        stat = os.stat(prm_filename)
+        prm = PRM(PRM._from_file_cached(os.path.abspath(prm_filename), stat.st_mtime_ns, stat.st_size))
         prm.filename = prm_filename
         return prm
 
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _from_file_cached(prm_filename, mtime, size):
+        """
+        Read parameter and value pairs from a PRM file with caching by the file modification time and size.
+
+        Parameters
+        ----------
+        prm_filename : str
+            The absolute filename of the PRM file.
+        mtime : int
+            The file modification time in nanoseconds.
+        size : int
+            The file size in bytes.
+
+        Returns
+        -------
+        PRM
+            A shared PRM object, it should be copied and never modified.
+        """
+        return PRM._from_io(prm_filename)
+
     @staticmethod
     def _from_io(prm):
         """
@@ -236,17 +355,39 @@ class PRM(datagrid, PRM_gmtsar):
 
         Parameters
         ----------
-        prm : IO stream
-            The IO stream.
+        prm : IO stream or str
+            The IO stream or the filename.
 
         Returns
         -------
         PRM
             A PRM object.
         """
+        import numpy as np
         import pandas as pd
-        return PRM(pd.read_csv(prm, sep='\s+=\s+', header=None, names=['name', 'value'], engine='python').set_index('name')\
-                    .applymap(lambda val : pd.to_numeric(val,errors='ignore')))
+
+        def to_numeric(value):
+            for dtype in (np.int64, np.float64):
+                try:
+                    return dtype(value)
+                except (ValueError, OverflowError):
+                    pass
+            return value
+
+        if isinstance(prm, str):
+            with open(prm) as f:
+                lines = f.read().splitlines()
+        else:
+            lines = prm.read().splitlines()
+        # "name = value" lines with any whitespace around the separator
+        # empty and other lines (like to diagnostic messages in GMTSAR tools output) are skipped
+        pairs = [line.partition('=') for line in lines if '=' in line]
+        names = [name.strip() for name, _, _ in pairs]
+        values = [to_numeric(value.strip()) for _, _, value in pairs]
+        # numeric-only values are stored as float when any of them is float, the same as pandas parsers do
+        if not any([isinstance(value, str) for value in values]) and any([isinstance(value, np.float64) for value in values]):
+            values = [np.float64(value) for value in values]
+        return PRM(pd.DataFrame({'value': values}, index=pd.Index(names, name='name')))
 
     def __init__(self, prm=None):
         """
@@ -263,15 +404,28 @@ class PRM(datagrid, PRM_gmtsar):
         """
         import pandas as pd
         #print ('__init__')
+        # PRM objects are deduplicated already, copy the dataframe only
+        if isinstance(prm, PRM):
+            self.df = prm.df.copy()
+            self.filename = None
+            self._lookup = None
+            return
         if prm is None:
             _prm = pd.DataFrame(None,columns=['name','value'])
         elif isinstance(prm, pd.DataFrame):
             _prm = prm.reset_index()
         else:
-            _prm = prm.df.reset_index()
-        self.df = _prm[['name', 'value']].drop_duplicates(keep='last', inplace=False).set_index('name')\
-            .applymap(lambda val : pd.to_numeric(val,errors='ignore'))
+            raise Exception('Argument "prm" should be PRM class instance or pandas DataFrame')
+        self.df = _prm[['name', 'value']].drop_duplicates(keep='last', inplace=False).set_index('name')
+        # PRM parsers return typed values already, convert only the numeric strings column in a single pass
+        if len(self.df) > 0 and self.df['value'].dtype == object:
+            try:
+                self.df['value'] = pd.to_numeric(self.df['value'])
+            except (ValueError, TypeError):
+                pass
         self.filename = None
+        # lazy name to value lookup for get()
+        self._lookup = None
 
     def __eq__(self, other):
         """
@@ -336,15 +490,33 @@ class PRM(datagrid, PRM_gmtsar):
             The updated PRM object.
         """
         import numpy as np
+        import pandas as pd
+
+        def set_values(values):
+            # the last value wins for duplicate names as for sequential assignments
+            values = values[~values.index.duplicated(keep='last')]
+            # update existing names in a single assignment
+            exists = self.df.index.isin(values.index)
+            if exists.any():
+                self.df.loc[exists, 'value'] = values.reindex(self.df.index[exists]).to_numpy()
+            # append new names in the defined order
+            append = values[~values.index.isin(self.df.index)]
+            if len(append) > 0:
+                self.df = pd.concat([self.df, append.to_frame('value')]) if len(self.df) > 0 \
+                    else append.to_frame('value')
+                self.df.index.name = 'name'
 
         if isinstance(prm, PRM):
-            for (key, value) in prm.df.itertuples():
-                self.df.loc[key] = value
+            set_values(prm.df['value'])
         elif prm is not None:
             raise Exception('Arguments is not a PRM object')
-        for key, value in kwargs.items():
-            self.df.loc[key] = float(format(value, 'g')) if gformat and type(value) \
-                in [float, np.float16, np.float32, np.float64] else value
+        if len(kwargs) > 0:
+            values = [float(format(value, 'g')) if gformat and type(value) \
+                in [float, np.float16, np.float32, np.float64] else value for value in kwargs.values()]
+            # use object type to keep integer values as is when there are float values too
+            set_values(pd.Series(values, index=pd.Index(list(kwargs.keys()), name='name'), dtype=object))
+        # invalidate get() lookup
+        self._lookup = None
         return self
 
     def to_dataframe(self):
@@ -373,6 +545,9 @@ class PRM(datagrid, PRM_gmtsar):
             The PRM object.
         """
         self._to_io(prm)
+        # the rewritten file can have the same size and modification time (for coarse filesystem timestamps)
+        # so the parsed files cache should be invalidated explicitly, update() saves the file here too
+        PRM._from_file_cached.cache_clear()
         return self
 
     #def update(self):
@@ -511,7 +686,13 @@ class PRM(datagrid, PRM_gmtsar):
         PRM
             The new PRM object with selected attributes.
         """
-        return PRM(self.df.loc[[*args]])
+        if len(set(args)) < len(args):
+            return PRM(self.df.loc[[*args]])
+        # subset of deduplicated PRM for unique names is deduplicated too
+        # the selection is a new dataframe already, do not copy the full dataframe for the new PRM object
+        prm = PRM()
+        prm.df = self.df.loc[[*args]]
+        return prm
 
     def __add__(self, other):
         """
@@ -574,7 +755,14 @@ class PRM(datagrid, PRM_gmtsar):
             The values of the specified attributes. If only one attribute is requested, 
             return its value directly. If multiple attributes are requested, return a list of values.
         """
-        out = [self.df.loc[[key]].iloc[0].values[0] for key in args]
+        # build name to value lookup once, it is rebuilt after set() call or dataframe replacement
+        lookup = getattr(self, '_lookup', None)
+        if lookup is None or lookup[0] is not self.df:
+            # use the first value for duplicate names
+            names = self.df.index.to_numpy()[::-1]
+            values = self.df['value'].to_numpy()[::-1]
+            lookup = self._lookup = (self.df, dict(zip(names, values)))
+        out = [lookup[1][key] for key in args]
         if len(out) == 1:
             return out[0]
         return out
@@ -647,23 +835,29 @@ class PRM(datagrid, PRM_gmtsar):
         fitoffset(3, 3, matrix_fromfile='raw/offset.dat')
         """
         import numpy as np
+        import pandas as pd
         import math
 
         if (matrix is None and matrix_fromfile is None) or (matrix is not None and matrix_fromfile is not None):
             raise Exception('One and only one argument matrix or matrix_fromfile should be defined')
         if matrix_fromfile is not None:
-            matrix = np.genfromtxt(matrix_fromfile)
+            # offset file columns: range, range offset, azimuth, azimuth offset, SNR
+            matrix = pd.read_csv(matrix_fromfile, sep=r'\s+', header=None, usecols=range(5),
+                                 dtype=np.float64, engine='c').to_numpy()
 
-        #  first extract the range and azimuth data
-        rng = matrix[np.where(matrix[:,4]>SNR)][:,[0,2,1]]
-        azi = matrix[np.where(matrix[:,4]>SNR)][:,[0,2,3]]
+        #  first extract the range and azimuth data as contiguous columns
+        mask = matrix[:,4]>SNR
+        x   = matrix[mask,0]
+        y   = matrix[mask,2]
+        rng = matrix[mask,1]
+        azi = matrix[mask,3]
 
         # make sure there are enough points remaining
-        if rng.shape[0] < 8:
-            raise Exception(f'FAILED - not enough points to estimate parameters, try lower SNR ({rng.shape[0]} < 8)')
+        if x.size < 8:
+            raise Exception(f'FAILED - not enough points to estimate parameters, try lower SNR ({x.size} < 8)')
 
-        rng_coef = PRM.robust_trend2d(rng, rank_rng)
-        azi_coef = PRM.robust_trend2d(azi, rank_azi)
+        # fit range and azimuth offsets on the same coordinates together
+        rng_coef, azi_coef = PRM.robust_trend2d_batch(x, y, [rng, azi], [rank_rng, rank_azi])
 
         # print MSE (optional)
         #rng_mse = PRM.robust_trend2d_mse(rng, rng_coef, rank_rng)
@@ -671,7 +865,7 @@ class PRM(datagrid, PRM_gmtsar):
         #print ('rng_mse_norm', rng_mse/len(rng), 'azi_mse_norm', azi_mse/len(azi))
 
         # range and azimuth data ranges
-        scale_coef = [np.min(rng[:,0]), np.max(rng[:,0]), np.min(rng[:,1]), np.max(rng[:,1])]
+        scale_coef = [np.min(x), np.max(x), np.min(y), np.max(y)]
 
         #print ('rng_coef', rng_coef)
         #print ('azi_coef', azi_coef)
@@ -699,6 +893,49 @@ class PRM(datagrid, PRM_gmtsar):
 
         return prm
 
+    # PRM.fitoffset_batch([offset_dat1, 'raw/offset2.dat'], 3, 3)
+    @staticmethod
+    def fitoffset_batch(pairs, rank_rng, rank_azi, SNR=20, n_jobs=-1):
+        """
+        Estimates range and azimuth offsets for multiple InSAR pairs in parallel.
+
+        Parameters
+        ----------
+        pairs : list
+            List of offset estimates, every item is numpy.ndarray array or path to the offset file.
+        rank_rng : int
+            Number of parameters to fit in the range direction.
+        rank_azi : int
+            Number of parameters to fit in the azimuth direction.
+        SNR : int, optional
+            Signal-to-noise ratio cutoff. Default is 20.
+        n_jobs : int, optional
+            Number of parallel processes. Default is -1 (use all the cores). For less than 8 pairs
+            the fits are processed sequentially because the process startup overhead is larger
+            than the fitting time.
+
+        Returns
+        -------
+        list of PRM objects
+            PRM objects with the calculated parameters in the same order as the pairs.
+
+        Example
+        -------
+        fitoffset_batch(['raw/offset1.dat', 'raw/offset2.dat'], 3, 3)
+        """
+        import numpy as np
+        import joblib
+
+        def fitoffset(pair):
+            if isinstance(pair, np.ndarray):
+                return PRM.fitoffset(rank_rng, rank_azi, matrix=pair, SNR=SNR)
+            return PRM.fitoffset(rank_rng, rank_azi, matrix_fromfile=pair, SNR=SNR)
+
+        if len(pairs) < 8:
+            n_jobs = 1
+        return joblib.Parallel(n_jobs=n_jobs, backend='loky', batch_size='auto')(joblib.delayed(fitoffset)(pair) \
+                                                                                  for pair in pairs)
+
     def diff(self, other, gformat=True):
         """
         Compare the PRM object with another PRM object and return the differences.
@@ -724,17 +961,26 @@ class PRM(datagrid, PRM_gmtsar):
         df1 = self.df.copy()
         df2 = other.df.copy()
 
+        # convert float values only to strings using 'g' format
+        def gformat_values(values):
+            if values.dtype.kind == 'f':
+                return np.char.mod('%g', values.to_numpy()).tolist()
+            values = values.astype(object)
+            mask = values.map(type).isin([float, np.float16, np.float32, np.float64])
+            if mask.any():
+                values[mask] = np.char.mod('%g', values[mask].to_numpy(dtype=np.float64)).tolist()
+            return values
+
         if gformat:
-            fmt = lambda v: format(v, 'g') if type(v) in [float, np.float16, np.float32, np.float64] else v
-            df1['value'] = [fmt(value) for value in df1['value']]
-            df2['value'] = [fmt(value) for value in df2['value']]
+            df1['value'] = gformat_values(df1['value'])
+            df2['value'] = gformat_values(df2['value'])
 
         return pd.concat([df1, df2]).drop_duplicates(keep=False)
 
     # see about correlation filter
     # https://github.com/gmtsar/gmtsar/issues/86
     def intf(self, other, basedir, topo_ra_fromfile, basename=None, wavelength=200, psize=32, \
-            func=None, chunksize=None, debug=False):
+            func=None, chunksize=None, debug=False, n_jobs=1, keepbits=(10, 12)):
         """
         Perform interferometric processing on the input SAR data.
 
@@ -758,6 +1004,15 @@ class PRM(datagrid, PRM_gmtsar):
             Chunk size for dask arrays. Default is None.
         debug : bool, optional
             Enable debug mode. Default is False.
+        n_jobs : int, optional
+            Number of the independent GMTSAR filtering chains (up to 4) to run concurrently. Default is 1.
+            Use it only when the interferogram is processed alone because every chain runs GMTSAR tools
+            and the amplitude chains require a lot of RAM to decode SLC files.
+        keepbits : int, tuple or None, optional
+            Number of float32 mantissa bits to keep for the correlation and the phase output grids,
+            a single integer value is used for both the grids.
+            Rounding of the insignificant bits improves the compression. Should be from 1 to 22. Default is (10, 12),
+            use None to save the grids without rounding.
 
         Returns
         -------
@@ -773,15 +1028,25 @@ class PRM(datagrid, PRM_gmtsar):
         import numpy as np
         import xarray as xr
         #from scipy import signal
-        import dask_image.ndfilters
         import dask.array
+        import joblib
 
         # constant from GMTSAR code
-        thresh = 5.e-21
+        # use float32 for all the post-processing grids to do not promote them to float64
+        thresh = np.float32(5.e-21)
 
         if not isinstance(other, PRM):
             raise Exception('Argument "other" should be PRM class instance')
 
+        # validate keepbits before the processing because the output grids are rounded at the end
+        if keepbits is not None:
+            # the same number of bits for both the grids
+            if np.isscalar(keepbits):
+                keepbits = (keepbits, keepbits)
+            if not isinstance(keepbits, (tuple, list)) or len(keepbits) != 2 \
+                    or not all([isinstance(bits, (int, np.integer)) and 1 <= bits <= 22 for bits in keepbits]):
+                raise Exception('Argument "keepbits" should be None, integer or a pair of integers from 1 to 22')
+
         # define lost class variables due to joblib
         if chunksize is None:
             chunksize = self.chunksize
@@ -821,40 +1086,41 @@ class PRM(datagrid, PRM_gmtsar):
                        real_tofile=fullname('real.grd=bf'),
                        debug=debug)
 
-        # making amplitudes
-        self.conv(1, 2, filter_file = filename_gauss5x5,
-                  output_file=fullname('amp1_tmp.grd=bf'),
-                  debug=debug)
-        self.conv(1, 2, filter_string=gauss_string,
-                  input_file=fullname('amp1_tmp.grd=bf'),
-                  output_file=fullname('amp1.grd'),
-                  debug=debug)
-
-        other.conv(1, 2, filter_file = filename_gauss5x5,
-                   output_file=fullname('amp2_tmp.grd=bf'),
-                   debug=debug)
-        other.conv(1, 2, filter_string=gauss_string,
-                   input_file=fullname('amp2_tmp.grd=bf'),
-                   output_file=fullname('amp2.grd'),
-                   debug=debug)
-
-        # filtering interferogram
-        self.conv(1, 2, filter_file=filename_gauss5x5,
-                  input_file=fullname('real.grd=bf'),
-                  output_file=fullname('real_tmp.grd=bf'),
-                  debug=debug)
-        other.conv(1, 2, filter_string=gauss_string,
-                   input_file=fullname('real_tmp.grd=bf'),
-                   output_file=fullname('realfilt.grd'),
-                   debug=debug)
-        self.conv(1, 2, filter_file=filename_gauss5x5,
-                  input_file=fullname('imag.grd=bf'),
-                  output_file=fullname('imag_tmp.grd=bf'),
-                  debug=debug)
-        other.conv(1, 2, filter_string=gauss_string,
-                   input_file=fullname('imag_tmp.grd=bf'),
-                   output_file=fullname('imagfilt.grd'),
-                   debug=debug)
+        # remove intermediate grid as soon as it is consumed
+        # freshly written and removed file pages can be dropped from the page cache without writing to disk
+        # unlink the file directly without the additional stat call for existence check
+        def remove(name):
+            try:
+                os.remove(fullname(name))
+            except FileNotFoundError:
+                pass
+
+        # 5x5 gaussian filter followed by wavelength-defined gaussian filter
+        # use GMT native binary format for the intermediate grids
+        # note: the filtered grids cannot be kept in memory because phasefilt tool requires them as files
+        # and conv decodes SLC amplitudes and decimates the grids, it is not a plain gaussian filter
+        def conv_gaussian(prm, input_name, tmp_name, output_name):
+            prm.conv(1, 2, filter_file=filename_gauss5x5,
+                     input_file=fullname(input_name + '=bf') if input_name is not None else None,
+                     output_file=fullname(tmp_name + '=bf'),
+                     debug=debug)
+            if input_name is not None:
+                remove(input_name)
+            prm.conv(1, 2, filter_string=gauss_string,
+                     input_file=fullname(tmp_name + '=bf'),
+                     output_file=fullname(output_name),
+                     debug=debug)
+            remove(tmp_name)
+
+        # making amplitudes and filtering interferogram
+        # the chains are independent and GMTSAR tools run as subprocesses so the threads do not compete for GIL
+        # the chains run sequentially by default because intf_parallel() already runs intf() on all the processors
+        joblib.Parallel(n_jobs=n_jobs, backend='threading')(joblib.delayed(conv_gaussian)(*args) for args in [
+            (self,  None,       'amp1_tmp.grd', 'amp1.grd'),
+            (other, None,       'amp2_tmp.grd', 'amp2.grd'),
+            (self,  'real.grd', 'real_tmp.grd', 'realfilt.grd'),
+            (self,  'imag.grd', 'imag_tmp.grd', 'imagfilt.grd')
+        ])
 
         # filtering phase
         self.phasefilt(imag_fromfile=fullname('imagfilt.grd'),
@@ -865,63 +1131,140 @@ class PRM(datagrid, PRM_gmtsar):
                        corrfilt_tofile=fullname('phasefilt_corr.grd'),
                        psize=psize,
                        debug=debug)
+        # the filtered correlation is not used
+        remove('phasefilt_corr.grd')
 
         # Python post-processing
+        # use full-row bands for all the grids: the convolution halo exchange is required only between the bands
+        # and the same chunks are shared by the correlation and the filtered phase computation
+        chunks = chunksize if isinstance(chunksize, dict) else {'y': chunksize, 'x': -1}
         # we need to flip vertically results from the command line tools
-        realfilt = xr.open_dataarray(fullname('realfilt.grd'), engine=self.engine, chunks=chunksize)
-        imagfilt = xr.open_dataarray(fullname('imagfilt.grd'), engine=self.engine, chunks=chunksize)
-        amp = np.sqrt(realfilt**2 + imagfilt**2)
-
-        amp1 = xr.open_dataarray(fullname('amp1.grd'), engine=self.engine, chunks=chunksize)
-        amp2 = xr.open_dataarray(fullname('amp2.grd'), engine=self.engine, chunks=chunksize)
+        # the readers expect ascending azimuth coordinates so the data is flipped instead of the coordinates,
+        # put the incomplete band on the top to have the flipped bands aligned with the output NetCDF chunks
+        if not isinstance(chunksize, dict):
+            with xr.open_dataarray(fullname('realfilt.grd'), engine=self.engine) as grid:
+                ysize = grid['y'].size
+            chunks['y'] = dask.array.core.normalize_chunks(chunksize, (ysize,))[0][::-1]
+        realfilt = xr.open_dataarray(fullname('realfilt.grd'), engine=self.engine, chunks=chunks).astype(np.float32, copy=False)
+        imagfilt = xr.open_dataarray(fullname('imagfilt.grd'), engine=self.engine, chunks=chunks).astype(np.float32, copy=False)
+        amp1 = xr.open_dataarray(fullname('amp1.grd'), engine=self.engine, chunks=chunks).astype(np.float32, copy=False)
+        amp2 = xr.open_dataarray(fullname('amp2.grd'), engine=self.engine, chunks=chunks).astype(np.float32, copy=False)
+
+        # the grids should be dask-backed to build a single lazy graph for all the computations below
+        realfilt, imagfilt, amp1, amp2 = [grid if grid.chunks is not None else grid.chunk(chunks) \
+                                          for grid in [realfilt, imagfilt, amp1, amp2]]
 
         # use the same coordinates for all output grids
-        # use .values to remove existing attributes from the axes
+        # use the raw coordinate arrays to remove existing attributes from the axes
         # workaround for Google Colab when we cannot save grids with x,y coordinate names
-        coords = {'a': amp.y.values, 'r': amp.x.values}
-
-        # making correlation
-        tmp = amp1 * amp2
-        # fix for "RuntimeWarning: divide by zero encountered in true_divide"
-        tmp = xr.where(tmp==0, np.nan, tmp)
-        mask = xr.where(tmp >= thresh, 1, np.nan)
-        tmp2 = mask * (amp/np.sqrt(tmp))
+        coords = {'a': realfilt['y'].data, 'r': realfilt['x'].data}
+
+        # making correlation in a single pass per block instead of a chain of the full-size intermediate grids
+        # corr = sqrt(realfilt² + imagfilt²)/sqrt(amp1*amp2) when amp1*amp2 >= thresh and NaN otherwise
+        # the zero and NaN amplitudes products are excluded by the threshold check
+        # the invalid pixels are filled by branchless masked copy instead of boolean fancy indexing
+        def fused_corr(rf, imf, a1, a2):
+            t = a1 * a2
+            invalid = ~(t >= thresh)
+            amp = rf * rf
+            amp += imf * imf
+            np.sqrt(amp, out=amp)
+            np.sqrt(t, out=t)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.divide(amp, t, out=amp)
+            np.copyto(amp, np.float32('nan'), where=invalid)
+            return amp
+        tmp2 = xr.apply_ufunc(fused_corr, realfilt, imagfilt, amp1, amp2,
+                              dask='parallelized', output_dtypes=[np.float32])
 
         #conv = signal.convolve2d(tmp2, fill_3x3/fill_3x3.sum(), mode='same', boundary='symm')
         # use dask rolling window for the same convolution - 1 border pixel is NaN here
         #kernel = xr.DataArray(fill_3x3, dims=['i', 'j'])/fill_3x3.sum()
         #conv = tmp2.rolling(y=3, x=3, center={'y': True, 'x': True}).construct(lat='j', lon='i').dot(kernel)
-        # use dask_image package
-        kernel = xr.DataArray(fill_3x3, dims=['y', 'x'])/fill_3x3.sum()
-        conv = dask_image.ndfilters.convolve(tmp2.data, kernel.data, mode='reflect')
+        # use scipy.ndimage convolution on dask blocks with the minimal halo defined by the kernel size
+        # use plain contiguous float32 array for the normalized kernel embedded into the dask graph
+        kernel = np.ascontiguousarray(fill_3x3/fill_3x3.sum(), dtype=np.float32)
+        # rank 1 kernel is separable and it can be applied as two 1D passes: 2k instead of k² operations per pixel
+        # the rank check is done in double precision to do not confuse float32 rounding with the kernel rank
+        u, sv, vt = np.linalg.svd(kernel.astype(np.float64))
+        from scipy import ndimage
+        if sv[1:].max() <= 1e-6 * sv[0]:
+            ky = (u[:,0]*np.sqrt(sv[0])).astype(np.float32)
+            kx = (vt[0]*np.sqrt(sv[0])).astype(np.float32)
+            def convolve_separable(block):
+                block = ndimage.convolve1d(block, ky, axis=0, mode='reflect')
+                return ndimage.convolve1d(block, kx, axis=1, mode='reflect')
+            # dask "reflect" boundary is the same as scipy.ndimage "reflect" mode
+            conv = tmp2.data.map_overlap(convolve_separable, depth=(ky.size//2, kx.size//2),
+                                         boundary='reflect', dtype=tmp2.dtype)
+        else:
+            # the same as dask_image.ndfilters.convolve(tmp2.data, kernel, mode='reflect') while the halo depth
+            # is pinned to the kernel half size and scipy releases GIL for the convolution
+            conv = tmp2.data.map_overlap(ndimage.convolve, depth=(kernel.shape[0]//2, kernel.shape[1]//2),
+                                         boundary='reflect', dtype=tmp2.dtype, weights=kernel, mode='reflect')
         
+        # round float32 mantissa to nearest with ties to even keeping the specified bits number
+        # zero bits compress much better and the relative error is less than 2**-(keepbits+1)
+        # NaN and infinity values are excluded because NaN payload bits can be rounded to infinity
+        def bitround(block, keepbits):
+            drop = np.uint32(23 - keepbits)
+            bits = block.view(np.uint32)
+            half = np.uint32((1 << (drop - 1)) - 1)
+            rounded = bits + half + ((bits >> drop) & np.uint32(1))
+            rounded &= ~np.uint32((1 << drop) - 1)
+            np.copyto(bits, rounded, where=np.isfinite(block))
+            return block
+
+        # save the grid with dask chunks aligned to NetCDF chunks, so every dask chunk writes complete NetCDF chunks
+        # float32 NaN fill value is the same datatype as the data
+        def to_netcdf(da, name, keepbits=None):
+            remove(name)
+            if isinstance(chunksize, dict):
+                # convert dask chunks for the input grid dimensions y, x to NetCDF chunk sizes for the output a, r
+                # the whole dimension is used for the undefined, -1 or 'auto' chunks
+                sizes = [chunksize.get(dim) for dim in ['y', 'x']]
+                nc_chunksize = tuple([size if isinstance(size, (int, np.integer)) and size > 0 else da.shape[idx] \
+                                      for idx, size in enumerate(sizes)])
+            else:
+                nc_chunksize = chunksize
+            encoding = self.compression(da.shape, chunksize=nc_chunksize)
+            da = da.chunk({da.dims[0]: encoding['chunksizes'][0]})
+            if da.dtype == np.float32:
+                encoding['_FillValue'] = np.float32(np.nan)
+                if keepbits is not None:
+                    # copy the block because it can be a view of the block used by other dask tasks
+                    da = da.copy(data=da.data.map_blocks(lambda block: bitround(block.copy(), keepbits)))
+            da.to_netcdf(fullname(name), encoding={da.name: encoding}, engine=self.engine)
+
         # wrap dask or numpy array to dataarray
-        corr_da = xr.DataArray(dask.array.flipud(conv.astype(np.float32)), coords, name='z')
+        corr_da = xr.DataArray(dask.array.flipud(conv), coords, name='z')
+        if debug:
+            assert corr_da.dtype == np.float32, f'ERROR: correlation grid should be float32, got {corr_da.dtype}'
         if func is not None:
             corr_da = func(corr_da)
-        if os.path.exists(fullname('corr.grd')):
-            os.remove(fullname('corr.grd'))
-        corr_da.to_netcdf(fullname('corr.grd'), encoding={'z': self.compression(corr_da.shape, chunksize=chunksize)}, engine=self.engine)
+        to_netcdf(corr_da, 'corr.grd', keepbits[0] if keepbits is not None else None)
 
         # make the Werner/Goldstein filtered phase
-        phasefilt_phase = xr.open_dataarray(fullname('phasefilt_phase.grd'), engine=self.engine, chunks=chunksize)
-        phasefilt_phase_masked = phasefilt_phase * mask
-        phasefilt_da = xr.DataArray(dask.array.flipud(phasefilt_phase_masked.astype(np.float32)), coords, name='z')
+        phasefilt_phase = xr.open_dataarray(fullname('phasefilt_phase.grd'), engine=self.engine, chunks=chunks).astype(np.float32, copy=False)
+        if phasefilt_phase.chunks is None:
+            phasefilt_phase = phasefilt_phase.chunk(chunks)
+        # mask the phase by the same amplitudes threshold in a single pass per block
+        # the correlation grids are not recomputed and no separate mask grid is required here
+        # branchless select keeps float32 type and the input block is not modified
+        def fused_mask(phase, a1, a2):
+            return np.where(a1 * a2 >= thresh, phase, np.float32('nan'))
+        phasefilt_phase_masked = xr.apply_ufunc(fused_mask, phasefilt_phase, amp1, amp2,
+                                                dask='parallelized', output_dtypes=[np.float32])
+        phasefilt_da = xr.DataArray(dask.array.flipud(phasefilt_phase_masked.data), coords, name='z')
+        if debug:
+            assert phasefilt_da.dtype == np.float32, f'ERROR: phase grid should be float32, got {phasefilt_da.dtype}'
         if func is not None:
             phasefilt_da = func(phasefilt_da)
-        if os.path.exists(fullname('phasefilt.grd')):
-            os.remove(fullname('phasefilt.grd'))
-        phasefilt_da.to_netcdf(fullname('phasefilt.grd'), encoding={'z': self.compression(phasefilt_da.shape, chunksize=chunksize)}, engine=self.engine)
+        to_netcdf(phasefilt_da, 'phasefilt.grd', keepbits[1] if keepbits is not None else None)
 
         # cleanup
-        for name in ['amp1_tmp.grd', 'amp2_tmp.grd', 'amp1.grd', 'amp2.grd',
-                     'real.grd', 'real_tmp.grd', 'realfilt.grd',
-                     'imag.grd', 'imag_tmp.grd', 'imagfilt.grd',
-                     'phasefilt_phase.grd', 'phasefilt_corr.grd']:
-            filename = fullname(name)
-            if not os.path.exists(filename):
-                continue
-            os.remove(filename)
+        for name in ['amp1.grd', 'amp2.grd', 'realfilt.grd', 'imagfilt.grd', 'phasefilt_phase.grd']:
+            remove(name)
 
         return
 
@@ -941,27 +1284,50 @@ class PRM(datagrid, PRM_gmtsar):
         The azimuth pixel size is determined using the spacecraft velocity, height, and pulse repetition frequency (PRF),
         while the range pixel size is calculated based on the speed of light and the range sampling rate.
         """
-        import numpy as np
+        import math
         from scipy.constants import speed_of_light
 
         # compute the range and azimuth pixel size
+        # use Python math for the scalar values to skip numpy ufunc dispatch
         RE, vel, ht, prf, fs, near_range, num_rng_bins = \
             self.get('earth_radius','SC_vel', 'SC_height', 'PRF', 'rng_samp_rate', 'near_range', 'num_rng_bins')
         #ER, vel, ht, prf, fs, near_range, num_rng_bins
         # real_vel/prf
-        azi_px_size = vel / np.sqrt(1 + ht / RE) / prf
+        azi_px_size = vel / math.sqrt(1 + ht / RE) / prf
         rng_px_size = speed_of_light / fs / 2.0
         # compute the cosine of the looking angle and the surface deviate angle
         a = ht + RE
         far_range = near_range + rng_px_size * num_rng_bins
         rng = (near_range + far_range) / 2.0
-        cost = (np.power(a, 2.0) + np.power(rng, 2.0) - np.power(RE, 2.0)) / 2.0 / a / rng
-        cosa = (np.power(a, 2.0) + np.power(RE, 2.0) - np.power(rng, 2.0)) / 2.0 / a / RE
+        a2, rng2, RE2 = a*a, rng*rng, RE*RE
+        cost = (a2 + rng2 - RE2) / 2.0 / a / rng
+        cosa = (a2 + RE2 - rng2) / 2.0 / a / RE
         # compute the ground range pixel size
-        rng_px_size = rng_px_size / np.sin(np.arccos(cost) + np.arccos(cosa))
+        rng_px_size = rng_px_size / math.sin(math.acos(cost) + math.acos(cosa))
         # ground spacing in meters
         return (azi_px_size, rng_px_size)
 
+    # basic SNAPHU config template, it is formatted by snaphu_config() function
+    _snaphu_config_basic = """
+        # basic config
+        INFILEFORMAT   FLOAT_DATA
+        OUTFILEFORMAT  FLOAT_DATA
+        AMPFILEFORMAT  FLOAT_DATA
+        CORRFILEFORMAT FLOAT_DATA
+        ALTITUDE       693000.0
+        EARTHRADIUS    6378000.0
+        NEARRANGE      831000
+        DR             18.4
+        DA             28.2
+        RANGERES       28
+        AZRES          44
+        LAMBDA         0.0554658
+        NLOOKSRANGE    1
+        NLOOKSAZ       1
+        TILEDIR        {tiledir}_snaphu_tiledir
+        NPROC          {n_jobs}
+        """
+
     # TODO: use PRM parameters to define config parameters
     def snaphu_config(self, defomax=0, **kwargs):
         """
@@ -1004,31 +1370,11 @@ class PRM(datagrid, PRM_gmtsar):
         tiledir = os.path.splitext(self.filename)[0]
         n_jobs = joblib.cpu_count()
 
-        conf_basic = f"""
-        # basic config
-        INFILEFORMAT   FLOAT_DATA
-        OUTFILEFORMAT  FLOAT_DATA
-        AMPFILEFORMAT  FLOAT_DATA
-        CORRFILEFORMAT FLOAT_DATA
-        ALTITUDE       693000.0
-        EARTHRADIUS    6378000.0
-        NEARRANGE      831000
-        DR             18.4
-        DA             28.2
-        RANGERES       28
-        AZRES          44
-        LAMBDA         0.0554658
-        NLOOKSRANGE    1
-        NLOOKSAZ       1
-        TILEDIR        {tiledir}_snaphu_tiledir
-        NPROC          {n_jobs}
-        """
-        conf_custom = '# custom config\n'
+        conf_basic = PRM._snaphu_config_basic.format(tiledir=tiledir, n_jobs=n_jobs)
         # defomax can be None
         keyvalues = ([('DEFOMAX_CYCLE', defomax)] if defomax is not None else []) + list(kwargs.items())
-        for key, value in keyvalues:
-            if isinstance(value, bool):
-                value = 'TRUE' if value else 'FALSE'
-            conf_custom += f'        {key} {value}\n'
+        # convert Python boolean values to SNAPHU ones
+        format_value = lambda value: ('TRUE' if value else 'FALSE') if isinstance(value, bool) else value
+        conf_custom = '# custom config\n' + ''.join([f'        {key} {format_value(value)}\n' for key, value in keyvalues])
         return conf_basic + conf_custom
 
@@ -50,7 +50,7 @@ class SBAS_intf(SBAS_topo_ra):
                      topo_ra_fromfile = topo_ra_file,
                      **kwargs)
 
-    def intf_parallel(self, pairs, n_jobs=-1, **kwargs):
+    def intf_parallel(self, pairs, n_jobs=-1, worker_jobs=None, **kwargs):
         """
         Build interferograms for all the subswaths in parallel.
 
@@ -60,6 +60,12 @@ class SBAS_intf(SBAS_topo_ra):
             List of date pairs (baseline pairs).
         n_jobs : int, optional
             Number of parallel processing jobs. n_jobs=-1 means all the processor cores used.
+        worker_jobs : int, optional
+            Number of interferograms processed by every worker process before its restart to release the memory.
+            Long interferogram series accumulate the workers memory on MacOS, see
+            https://github.com/mobigroup/gmtsar/commit/3eea6a52ddc608639e5e06306bce2f973a184fd6
+            so by default the workers are restarted after every interferogram on MacOS (as that commit does)
+            and they are never restarted on other platforms.
         wavelength : float, optional
             Filtering wavelength in meters.
         psize : int, optional
@@ -79,9 +85,9 @@ class SBAS_intf(SBAS_topo_ra):
         sbas.intf_parallel(pairs, func=decimator)
         """
         import pandas as pd
-        import numpy as np
         from tqdm.auto import tqdm
         import joblib
+        import platform
         import os
 
         # convert pairs (list, array, dataframe) to 2D numpy array
@@ -98,20 +104,55 @@ class SBAS_intf(SBAS_topo_ra):
         #    joblib.Parallel(n_jobs=n_jobs)(joblib.delayed(self.intf)(subswath, pair, **kwargs) \
         #        for subswath in subswaths for pair in pairs)
 
-        # workaround: start a set of jobs together but not more than available cpu cores at once
+        # workaround: use loky executors directly and restart every worker after worker_jobs jobs to release
+        # the memory accumulated by the worker, the code is loaded by every worker only once per restart
+        # every worker is a separate single-process executor so it is restarted alone while the other workers
+        # continue, there is no barrier between the jobs and the idle workers pick up the pending jobs
         from joblib.externals import loky
+        from concurrent.futures import wait, FIRST_COMPLETED
         if n_jobs == -1:
             n_jobs = joblib.cpu_count()
         # create list of arrays [subswath, date1, date2] where all the items are strings
         subpairs = [[subswath, pair[0], pair[1]] for subswath in subswaths for pair in pairs]
-        n_chunks = int(np.ceil(len(subpairs)/n_jobs))
-        chunks = np.array_split(subpairs, n_chunks)
-        #print ('n_jobs', n_jobs, 'n_chunks', n_chunks, 'chunks', [len(chunk) for chunk in chunks])
-        with tqdm(desc='Interferograms', total=len(subpairs)) as pbar:
-            for chunk in chunks:
-                loky.get_reusable_executor(kill_workers=True).shutdown(wait=True)
-                with joblib.parallel_backend('loky', n_jobs=n_jobs):
-                    # convert string subswath to integer value
-                    joblib.Parallel()(joblib.delayed(self.intf)(int(subswath), [date1, date2], **kwargs) \
-                        for (subswath,date1,date2) in chunk)
-                    pbar.update(len(chunk))
+        # number of jobs processed by every worker between the restarts
+        if worker_jobs is None:
+            worker_jobs = 1 if platform.system() == 'Darwin' else len(subpairs)
+        worker_jobs = max(1, worker_jobs)
+
+        jobs = iter(subpairs)
+        executors = [None] * n_jobs
+        counts = [0] * n_jobs
+        # running job future to worker index
+        running = {}
+        def submit(worker):
+            job = next(jobs, None)
+            if job is None:
+                return
+            if executors[worker] is not None and counts[worker] >= worker_jobs:
+                # the worker is idle here so the shutdown does not wait for other jobs
+                executors[worker].shutdown(wait=True, kill_workers=True)
+                executors[worker] = None
+            if executors[worker] is None:
+                executors[worker] = loky.ProcessPoolExecutor(max_workers=1)
+                counts[worker] = 0
+            counts[worker] += 1
+            subswath, date1, date2 = job
+            # convert string subswath to integer value
+            running[executors[worker].submit(self.intf, int(subswath), [date1, date2], **kwargs)] = worker
+
+        try:
+            with tqdm(desc='Interferograms', total=len(subpairs)) as pbar:
+                for worker in range(n_jobs):
+                    submit(worker)
+                while len(running) > 0:
+                    done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        worker = running.pop(future)
+                        # raise the job exception if any
+                        future.result()
+                        pbar.update(1)
+                        submit(worker)
+        finally:
+            for executor in executors:
+                if executor is not None:
+                    executor.shutdown(wait=True, kill_workers=True)
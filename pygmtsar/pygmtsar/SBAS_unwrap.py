@@ -11,7 +11,7 @@ from .SBAS_unwrap_snaphu import SBAS_unwrap_snaphu
 
 class SBAS_unwrap(SBAS_unwrap_snaphu):
 
-    def unwrap_parallel(self, pairs=None, mask=None, chunksize=None, n_jobs=-1, **kwargs):
+    def unwrap_parallel(self, pairs=None, mask=None, chunksize=None, n_jobs=-1, auto_tile=False, **kwargs):
         """
         Unwraps phase using SNAPHU in parallel for multiple interferogram pairs.
 
@@ -31,6 +31,11 @@ class SBAS_unwrap(SBAS_unwrap_snaphu):
         n_jobs : int, optional
             The number of jobs to run in parallel. -1 means using all available processors, default is -1.
 
+        auto_tile : bool, optional
+            Opt-in SNAPHU tiling: when there are less pairs than processors and SNAPHU configuration is not defined,
+            unwrap every interferogram on several processors using the tiles defined by the processors count.
+            Note that the unwrapping results depend on the tiling, default is False.
+
         **kwargs : dict
             Additional keyword arguments to be passed to the unwrap function.
 
@@ -55,6 +60,9 @@ class SBAS_unwrap(SBAS_unwrap_snaphu):
         cleaner = lambda corr, unwrap: xr.where(corr>=0.075, unwrap, np.nan)
         sbas.unwrap_parallel(pairs, threshold=0.075, mask=landmask_ra, func=cleaner)
 
+        Unwrap a few interferograms using automatic SNAPHU tiling on all the processors:
+        sbas.unwrap_parallel(pairs, threshold=0.075, auto_tile=True)
+
         Unwrap with coherence threshold 0.075 and use SNAPHU tiling for faster processing and smaller RAM usage:
         cleaner = lambda corr, unwrap: xr.where(corr>=0.075, unwrap, np.nan)
         conf = sbas.PRM().snaphu_config(NTILEROW=1, NTILECOL=2, ROWOVRLP=200, COLOVRLP=200)
@@ -69,12 +77,17 @@ class SBAS_unwrap(SBAS_unwrap_snaphu):
         import xarray as xr
         import pandas as pd
         from tqdm.auto import tqdm
+        import numpy as np
         import joblib
+        import hashlib
         import os
 
         # for now (Python 3.10.10 on MacOS) joblib loads the code from disk instead of copying it
         kwargs['chunksize'] = chunksize
 
+        # SNAPHU tiles overlap in pixels
+        tile_overlap = 200
+
         def unwrap_tiledir(pair, **kwargs):
             # define unique tiledir name for parallel processing
             if 'conf' in kwargs:
@@ -88,16 +101,56 @@ class SBAS_unwrap(SBAS_unwrap_snaphu):
         # materialize lazy mask
         if mask is not None and isinstance(mask, xr.DataArray):
             mask_filename = self.get_filenames(None, None, 'unwrapmask')
+            # compute the mask once for the hash and for the file
+            mask = mask.compute()
+            # the hash covers the grid values, type and coordinates
+            hasher = hashlib.blake2b(digest_size=16)
+            hasher.update(f'{mask.dtype}{mask.shape}'.encode())
+            for values in [mask.y.values, mask.x.values, mask.values]:
+                hasher.update(np.ascontiguousarray(values).tobytes())
+            mask_hash = hasher.hexdigest()
+            # skip the same mask writing on repeated calls
+            saved_hash = None
             if os.path.exists(mask_filename):
-                os.remove(mask_filename)
-            # workaround to save NetCDF file correct
-            mask.rename('mask').rename({'y':'a','x':'r'}).\
-                to_netcdf(mask_filename, encoding={'mask': self.compression(mask.shape, chunksize=chunksize)}, engine=self.engine)
+                # corrupted or truncated file (like to after killed previous run) is overwritten
+                try:
+                    with xr.open_dataarray(mask_filename, engine=self.engine) as saved:
+                        saved_hash = saved.attrs.get('mask_hash')
+                except (OSError, ValueError):
+                    saved_hash = None
+            if saved_hash != mask_hash:
+                if os.path.exists(mask_filename):
+                    os.remove(mask_filename)
+                # the mask is usually binary and it compresses well with shuffle filter and the fastest zlib level
+                # boolean grids are stored as int8 values by xarray
+                encoding = self.compression(mask.shape, complevel=1, chunksize=chunksize)
+                # workaround to save NetCDF file correct
+                mask.rename('mask').rename({'y':'a','x':'r'}).assign_attrs(mask_hash=mask_hash).\
+                    to_netcdf(mask_filename, encoding={'mask': encoding}, engine=self.engine)
             kwargs['mask'] = 'unwrapmask'
 
         # save results to NetCDF files
         kwargs['interactive'] = False
 
+        if n_jobs == -1:
+            n_jobs = joblib.cpu_count()
+        # for a few large interferograms split every one to SNAPHU tiles processed in parallel
+        # while for many interferograms process them in parallel using a single SNAPHU process for every one
+        if auto_tile and 'conf' not in kwargs and 0 < len(pairs) < n_jobs:
+            nproc = int(np.ceil(n_jobs/len(pairs)))
+            corr = kwargs.get('corr', 'corr')
+            if isinstance(corr, str):
+                corr = self.open_grids(pairs[:1], corr, chunksize=chunksize, interactive=False)[0]
+            ny, nx = corr.shape[-2:]
+            # follow the scene aspect ratio and do not make the tiles smaller than the doubled overlap
+            ntilerow = int(np.clip(np.round(np.sqrt(nproc*ny/nx)), 1, max(1, ny//(4*tile_overlap))))
+            ntilecol = int(np.clip(np.ceil(nproc/ntilerow), 1, max(1, nx//(4*tile_overlap))))
+            if ntilerow * ntilecol > 1:
+                kwargs['conf'] = self.PRM().snaphu_config(NTILEROW=ntilerow, NTILECOL=ntilecol,
+                                                          ROWOVRLP=tile_overlap, COLOVRLP=tile_overlap,
+                                                          NPROC=nproc)
+                n_jobs = len(pairs)
+
         with self.tqdm_joblib(tqdm(desc='Unwrapping', total=len(pairs))) as progress_bar:
             joblib.Parallel(n_jobs=n_jobs)(joblib.delayed(unwrap_tiledir)(pair, **kwargs) for pair in pairs)
 
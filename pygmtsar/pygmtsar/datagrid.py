@@ -57,12 +57,12 @@ class datagrid:
         Get the compression options for a data grid with shape (1000, 1000):
 
         >>> compression(shape=(1000, 1000))
-        {'zlib': True, 'complevel': 3, 'chunksizes': (512, 512)}
+        {'zlib': True, 'complevel': 3, 'shuffle': True, 'chunksizes': (512, 512)}
 
         Get the compression options for a data grid with chunksize 256:
 
         >>> compression(chunksize=256)
-        {'zlib': True, 'complevel': 3, 'chunksizes': (256, 256)}
+        {'zlib': True, 'complevel': 3, 'shuffle': True, 'chunksizes': (256, 256)}
         """
         import numpy as np
 
@@ -84,7 +84,8 @@ class datagrid:
                 chunksizes=(chunksize if chunksize<shape[0] else shape[0], chunksize if chunksize<shape[1] else shape[1])
             else:
                 chunksizes=(chunksize, chunksize)
-        return dict(zlib=True, complevel=complevel, chunksizes=chunksizes)
+        # byte shuffle filter improves the compression ratio and speed for numeric grids
+        return dict(zlib=True, complevel=complevel, shuffle=True, chunksizes=chunksizes)
 
     @staticmethod
     def is_ra(grid):